@@ -4,7 +4,8 @@
 
 import requests
 import json
-import pandas as pd
+import base64
+import csv
 import asyncio
 from playwright.async_api import async_playwright
 from datetime import datetime
@@ -16,7 +17,128 @@ import logging
 import argparse
 import signal
 import threading
-import random
+import hashlib
+import io
+import sqlite3
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json still works
+    orjson = None
+
+try:
+    import redis
+except ImportError:  # optional; sqlite response cache is the fallback
+    redis = None
+
+try:
+    import ijson
+except ImportError:  # optional; full-body JSON parse is the fallback
+    ijson = None
+
+try:
+    import brotli  # noqa: F401 — only probed so we know br is decodable
+except ImportError:
+    try:
+        import brotlicffi as brotli  # noqa: F401
+    except ImportError:
+        brotli = None
+
+
+def _json_loads(data):
+    """Decode JSON bytes/str with orjson when available (2-5x faster)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj):
+    """Encode a JSON HTTP body with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj)
+
+
+log = logging.getLogger(__name__)
+
+# Output CSV column order; doubles as the DictWriter schema for partial
+# and final saves.
+FIELDS = (
+    "product_number", "product_id", "material_id", "item_status",
+    "unit_list_price", "unit_regular_price", "unit_net_price", "actual_price",
+    "is_on_sale", "unit_of_measure", "distribution_centre", "division",
+    "category_group", "order_group", "qty_on_hand", "availability_message",
+    "available_date", "short_description", "erp_number", "erp_description",
+    "large_image_url", "shipping_length", "shipping_width", "shipping_height",
+    "shipping_weight", "unit_of_measure_description", "is_active",
+    "is_discontinued", "can_back_order", "track_inventory",
+    "minimum_order_qty", "multiple_sale_qty", "sku", "upc_code",
+    "model_number", "brand", "product_line", "tax_code1", "tax_code2",
+    "tax_category", "product_detail_url", "is_special_order", "is_gift_card",
+    "is_subscription", "can_add_to_cart", "can_add_to_wishlist",
+    "can_show_price", "can_show_unit_of_measure", "can_enter_quantity",
+    "requires_real_time_inventory", "availability_message_type",
+    "meta_description", "meta_keywords", "page_title",
+)
+
+# (output key, product-details key) pairs copied verbatim into each result
+# row; the nested availability fields are handled separately.
+_DETAIL_FIELDS = (
+    ("short_description", "shortDescription"),
+    ("erp_number", "erpNumber"),
+    ("erp_description", "erpDescription"),
+    ("large_image_url", "largeImagePath"),
+    ("shipping_length", "shippingLength"),
+    ("shipping_width", "shippingWidth"),
+    ("shipping_height", "shippingHeight"),
+    ("shipping_weight", "shippingWeight"),
+    ("unit_of_measure", "unitOfMeasure"),
+    ("unit_of_measure_description", "unitOfMeasureDescription"),
+    ("is_active", "isActive"),
+    ("is_discontinued", "isDiscontinued"),
+    ("can_back_order", "canBackOrder"),
+    ("track_inventory", "trackInventory"),
+    ("minimum_order_qty", "minimumOrderQty"),
+    ("multiple_sale_qty", "multipleSaleQty"),
+    ("sku", "sku"),
+    ("upc_code", "upcCode"),
+    ("model_number", "modelNumber"),
+    ("brand", "brand"),
+    ("product_line", "productLine"),
+    ("tax_code1", "taxCode1"),
+    ("tax_code2", "taxCode2"),
+    ("tax_category", "taxCategory"),
+    ("product_detail_url", "productDetailUrl"),
+    ("is_special_order", "isSpecialOrder"),
+    ("is_gift_card", "isGiftCard"),
+    ("is_subscription", "isSubscription"),
+    ("can_add_to_cart", "canAddToCart"),
+    ("can_add_to_wishlist", "canAddToWishlist"),
+    ("can_show_price", "canShowPrice"),
+    ("can_show_unit_of_measure", "canShowUnitOfMeasure"),
+    ("can_enter_quantity", "canEnterQuantity"),
+    ("requires_real_time_inventory", "requiresRealTimeInventory"),
+    ("meta_description", "metaDescription"),
+    ("meta_keywords", "metaKeywords"),
+    ("page_title", "pageTitle"),
+)
+
+def _compile_detail_row_builder():
+    """Compile _DETAIL_FIELDS into a function building the row in one go.
+
+    The generated lambda is a single dict display with literal keys, so
+    CPython assembles the row with one BUILD_MAP instead of looping over
+    (dst, src) tuples per product.
+    """
+    src = "lambda pd: {" + ", ".join(
+        f"{dst!r}: pd.get({key!r}, '')" for dst, key in _DETAIL_FIELDS
+    ) + "}"
+    return eval(compile(src, "<detail_row>", "eval"))
+
+
+_build_detail_row = _compile_detail_row_builder()
 
 stop_requested = False
 
@@ -30,6 +152,19 @@ signal.signal(signal.SIGINT, signal_handler)
 BASE_DIR = os.path.dirname(sys.executable) if getattr(sys, "frozen", False) else os.path.dirname(os.path.abspath(__file__))
 os.environ["PLAYWRIGHT_BROWSERS_PATH"] = os.path.join(BASE_DIR, "browsers")
 
+def extract_product_number(sku):
+    """Pull the Toro product number out of a SolidCommerce SKU.
+
+    SKUs look like ``TOR~41-6820~...``; everything after ``TOR~`` up to the
+    next ``~`` (or end of string) is the product number. Non-Toro SKUs
+    return None.
+    """
+    if not isinstance(sku, str) or not sku.startswith("TOR~"):
+        return None
+    product_number = sku[4:].split("~", 1)[0].strip()
+    return product_number or None
+
+
 def setup_logging_from_config(config_path):
     try:
         with open(config_path, "r") as f:
@@ -70,6 +205,170 @@ def setup_logging_from_config(config_path):
 
     return logger
 
+class TokenBucket:
+    """Thread-safe token bucket used to cap the outbound request rate."""
+
+    def __init__(self, rate_per_sec, burst=None):
+        self.rate = float(rate_per_sec)
+        self.max_rate = self.rate
+        self.min_rate = max(0.1, self.max_rate / 16)
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        """Block until `tokens` are available, then consume them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_throttle(self):
+        """Halve the sustained rate after a 429 (multiplicative decrease)."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            return self.rate
+
+    def on_success(self):
+        """Creep the rate back toward the configured maximum (additive increase)."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.01)
+
+
+class AdaptiveLimiter:
+    """AIMD cap on in-flight requests, layered under the thread pool.
+
+    Every HTTP call holds a permit while on the wire. A 429/5xx halves the
+    permit count (multiplicative decrease) and each success restores one
+    (additive increase), so effective concurrency tracks what the server
+    will sustain even though the pool size stays fixed.
+    """
+
+    def __init__(self, max_permits):
+        self.max_permits = max(1, int(max_permits))
+        self.level = self.max_permits
+        self._sem = threading.Semaphore(self.max_permits)
+        self._lock = threading.Lock()
+        self._debt = 0  # permits to swallow on release instead of returning
+
+    def acquire(self):
+        self._sem.acquire()
+
+    def release(self):
+        with self._lock:
+            if self._debt > 0:
+                self._debt -= 1
+                return
+        self._sem.release()
+
+    def on_throttle(self):
+        """Halve the permit level; returns the new level."""
+        with self._lock:
+            target = max(1, self.level // 2)
+            self._debt += self.level - target
+            self.level = target
+            return target
+
+    def on_success(self):
+        """Restore one permit, up to the configured maximum."""
+        with self._lock:
+            if self._debt > 0:
+                # Cancel a pending shrink; the permit never left circulation.
+                self._debt -= 1
+                self.level += 1
+            elif self.level < self.max_permits:
+                self.level += 1
+                self._sem.release()
+
+
+class ResponseCache:
+    """SQLite-backed TTL cache for slowly-changing API responses."""
+
+    def __init__(self, path, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, ts REAL, payload TEXT)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached value for key, or None when missing/expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ts, payload FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if not row or time.time() - row[0] > self.ttl:
+            return None
+        try:
+            return json.loads(row[1])
+        except Exception:
+            return None
+
+    def set(self, key, value):
+        try:
+            payload = json.dumps(value)
+        except Exception:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, ts, payload) VALUES (?, ?, ?)",
+                (key, time.time(), payload),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisResponseCache:
+    """Redis-backed TTL cache; same interface as ResponseCache.
+
+    Lets several machines (or a scraper and an ad-hoc rerun) share one
+    cache; Redis expires entries itself via SETEX.
+    """
+
+    def __init__(self, url, ttl):
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        """Return the cached value for key, or None when missing/expired."""
+        try:
+            blob = self._client.get(f"toro:{key}")
+        except Exception as e:
+            log.warning(f"Redis cache read failed: {e}")
+            return None
+        if blob is None:
+            return None
+        try:
+            return json.loads(blob)
+        except Exception:
+            return None
+
+    def set(self, key, value):
+        try:
+            self._client.setex(f"toro:{key}", self.ttl, json.dumps(value))
+        except Exception as e:
+            log.warning(f"Redis cache write failed: {e}")
+
+    def close(self):
+        try:
+            self._client.close()
+        except Exception:
+            pass
+
+
 class ToroScraperPlaywright:
     def __init__(self, config_file=None):
         if not config_file:
@@ -78,61 +377,267 @@ class ToroScraperPlaywright:
             config_file = os.path.join(BASE_DIR, config_file)
         self.config = self.load_config(config_file)
         self.save_interval = int(self.config.get("save_interval", 0))  # 0 means no incremental saving
+        self.concurrency = int(self.config.get("concurrency", 6))
         self.partial_file = self.config.get("output_file", "toro_pricing_output.csv") + ".partial"
+        self._partial_fh = None
+        self._partial_writer = None
+        self._partial_flushed = 0  # how many of self.results are already on disk
+        self._write_q = None
+        self._writer_thread = None
         self.processed_count = 0
-        self.scraped_product_numbers = set()
         self.lock = threading.Lock()
         self.bearer_token = None
         self.session = requests.Session()
-        self.results = []
+        # All calls hit the one host; keep sockets warm so we pay the
+        # TCP+TLS handshake once per connection, not once per request.
+        # urllib3's default pool of 10 churns connections under load, so
+        # size the pool to the worker count (x4 headroom covers the parallel
+        # details fetches and CLI concurrency overrides). Retries stay at 0
+        # here because _request_with_backoff owns the retry/backoff policy.
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.concurrency * 2,
+            pool_maxsize=self.concurrency * 4,
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Connection"] = "keep-alive"
+        # Make the compression offer explicit. Only advertise br when a
+        # brotli decoder is importable: urllib3 won't decode it otherwise,
+        # and a server honoring the offer would hand us undecodable bytes.
+        self.session.headers["Accept-Encoding"] = (
+            "gzip, deflate, br" if brotli is not None else "gzip, deflate"
+        )
+        # product_number -> row; insertion-ordered, so saves stream values()
+        # and dedupe is O(1) on insert instead of a rescan at every save.
+        self.results = {}
         self._reauth_lock = threading.Lock()
+        # Warm Playwright browser shared by login and re-auth; it lives on a
+        # dedicated background event loop so worker threads can reach it.
+        self._playwright = None
+        self._browser = None
+        self._auth_loop = None
+        self._auth_thread = None
+        # item_status values whose products skip the details fetch entirely
+        # (e.g. discontinued stock); normalized once, checked per product.
+        self._inactive_statuses = {
+            str(s).strip().lower() for s in self.config.get("inactive_statuses") or []
+        }
+        rps = float(self.config.get("rps", 0) or 0)
+        self.limiter = TokenBucket(rps, self.config.get("burst")) if rps > 0 else None
+        # Created in scrape_all_products once the final concurrency is known
+        # (the CLI can override it after __init__).
+        self._permits = None
+        # product_number -> productId is effectively static; cache it across
+        # runs so warm runs skip the catalog lookup entirely.
+        self._pid_cache_lock = threading.Lock()
+        self._pid_cache = self._load_pid_cache()
+        self._pid_cache_dirty = False
+        # Optional response cache for the pricing/details endpoints; enabled
+        # by setting cache_ttl (seconds) in the config. redis_url selects a
+        # shared Redis backend, otherwise a local sqlite file is used.
+        cache_ttl = int(self.config.get("cache_ttl", 0) or 0)
+        self.response_cache = None
+        if cache_ttl > 0:
+            redis_url = (self.config.get("redis_url") or "").strip()
+            if redis_url and redis is not None:
+                self.response_cache = RedisResponseCache(redis_url, cache_ttl)
+                log.info("Using Redis response cache")
+            else:
+                if redis_url:
+                    log.warning("redis package not installed; using sqlite response cache")
+                self.response_cache = ResponseCache(
+                    os.path.join(BASE_DIR, "response_cache.db"), cache_ttl
+                )
+
+    def _pid_cache_path(self):
+        return os.path.join(BASE_DIR, "pid_cache.json")
+
+    def _load_pid_cache(self):
+        try:
+            with open(self._pid_cache_path(), "r") as f:
+                cache = json.load(f)
+            if isinstance(cache, dict):
+                log.info(f"Loaded {len(cache)} cached product ids")
+                return cache
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.warning(f"Failed to load product id cache: {e}")
+        return {}
+
+    def _save_pid_cache(self):
+        with self._pid_cache_lock:
+            if not self._pid_cache_dirty:
+                return
+            try:
+                with open(self._pid_cache_path(), "w") as f:
+                    json.dump(self._pid_cache, f)
+                self._pid_cache_dirty = False
+            except Exception as e:
+                log.warning(f"Failed to save product id cache: {e}")
+
+    def _token_cache_path(self):
+        return os.path.join(BASE_DIR, ".token_cache.json")
+
+    @staticmethod
+    def _token_expiry(token):
+        """Best-effort read of the JWT exp claim; returns 0 when unreadable."""
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            claims = json.loads(base64.urlsafe_b64decode(payload))
+            return float(claims.get("exp", 0))
+        except Exception:
+            return 0.0
+
+    def _store_cached_token(self, token):
+        try:
+            exp = self._token_expiry(token)
+            if not exp:
+                # Not a decodable JWT; fall back to a configured lifetime.
+                exp = time.time() + float(self.config.get("token_ttl", 1800))
+            with open(self._token_cache_path(), "w") as f:
+                json.dump({"token": token, "exp": exp}, f)
+        except Exception as e:
+            log.warning(f"Failed to cache bearer token: {e}")
+
+    def _load_cached_token(self):
+        """Return a cached bearer token that is still valid for 60s+, else None."""
+        try:
+            with open(self._token_cache_path(), "r") as f:
+                cached = json.load(f)
+            token = cached.get("token")
+            exp = float(cached.get("exp") or 0)
+            if token and exp - time.time() > 60:
+                return token
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.warning(f"Failed to load cached token: {e}")
+        return None
+
+    def _invalidate_cached_token(self):
+        try:
+            os.remove(self._token_cache_path())
+        except OSError:
+            pass
+
+    def _set_session_token(self, token):
+        self.bearer_token = token
+        self.session.headers.update({
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        })
+
+    def _ensure_auth_loop(self):
+        """Start (once) the background event loop that owns the browser."""
+        if self._auth_loop is None:
+            self._auth_loop = asyncio.new_event_loop()
+            self._auth_thread = threading.Thread(target=self._auth_loop.run_forever, daemon=True)
+            self._auth_thread.start()
+        return self._auth_loop
+
+    def _authenticate(self):
+        """Run the Playwright login on the auth loop; safe from any thread."""
+        loop = self._ensure_auth_loop()
+        future = asyncio.run_coroutine_threadsafe(self.authenticate_with_playwright(), loop)
+        return future.result()
+
+    async def _ensure_browser(self):
+        if self._browser is None:
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(
+                headless=self.config.get("headless_mode", True)
+            )
+        return self._browser
+
+    async def _shutdown_browser(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    def close(self):
+        """Shut down the warm browser and its background loop, if running."""
+        if self._auth_loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown_browser(), self._auth_loop).result(timeout=30)
+        except Exception as e:
+            log.warning(f"Browser shutdown failed: {e}")
+        self._auth_loop.call_soon_threadsafe(self._auth_loop.stop)
+        self._auth_thread.join(timeout=10)
+        self._auth_loop.close()
+        self._auth_loop = None
+        self._auth_thread = None
 
     def _sync_reauthenticate(self) -> bool:
         with self._reauth_lock:
             try:
-                def run_auth():
-                    loop = asyncio.new_event_loop()
-                    try:
-                        asyncio.set_event_loop(loop)
-                        return loop.run_until_complete(self.authenticate_with_playwright())
-                    finally:
-                        loop.close()
-
-                ok = run_auth()
+                self._invalidate_cached_token()
+                ok = self._authenticate()
                 if ok and self.bearer_token:
                     self.session.headers.update({"Authorization": f"Bearer {self.bearer_token}"})
                     return True
                 return False
             except Exception as e:
-                logging.getLogger(__name__).error(f"Re-auth wrapper failed: {e}")
+                log.error(f"Re-auth wrapper failed: {e}")
                 return False
 
     def _request_with_backoff(self, method, url, **kwargs):
-        log = logging.getLogger(__name__)
         max_attempts = 4
         backoff = 1.0
         reauth_attempted = False
 
         for attempt in range(1, max_attempts + 1):
             try:
-                resp = self.session.request(method, url, timeout=15, **kwargs)
+                if self.limiter:
+                    self.limiter.acquire()
+                permits = self._permits
+                if permits is not None:
+                    permits.acquire()
+                try:
+                    resp = self.session.request(method, url, timeout=15, **kwargs)
+                finally:
+                    if permits is not None:
+                        permits.release()
 
                 if resp.status_code == 429:
                     retry_after = resp.headers.get("Retry-After")
                     sleep_s = float(retry_after) if retry_after else backoff
+                    if self.limiter:
+                        new_rate = self.limiter.on_throttle()
+                        log.warning(f"429 Rate limited; lowering request rate to {new_rate:.2f} rps")
+                    if self._permits is not None:
+                        level = self._permits.on_throttle()
+                        log.warning(f"429 Rate limited; lowering effective concurrency to {level}")
                     log.warning(f"429 Rate limited. Attempt {attempt}/{max_attempts}. Sleeping {sleep_s:.1f}s")
+                    # Streamed responses are never read on this path; close
+                    # so the connection isn't leaked while retrying.
+                    resp.close()
                     time.sleep(sleep_s)
                     backoff = min(backoff * 2, 8.0)
                     continue
 
                 if resp.status_code in (401, 403):
-                    body_text = ""
+                    # Byte-level check: resp.text would charset-decode the
+                    # whole body just to find an ASCII marker.
                     try:
-                        body_text = resp.text or ""
+                        body = resp.content or b""
                     except Exception:
-                        pass
+                        body = b""
 
-                    if "Customer Product Restriction" in body_text:
+                    if b"Customer Product Restriction" in body:
                         return resp
 
                     if not reauth_attempted:
@@ -144,13 +649,24 @@ class ToroScraperPlaywright:
                             log.error("Re-auth attempt failed.")
 
                 if 500 <= resp.status_code < 600:
+                    if self._permits is not None:
+                        level = self._permits.on_throttle()
+                        log.warning(f"Server error; lowering effective concurrency to {level}")
                     if attempt < max_attempts:
                         log.warning(f"Server error {resp.status_code}. Attempt {attempt}/{max_attempts}. Retrying in {backoff:.1f}s")
+                        resp.close()  # may be streamed and unread; see 429 path
                         time.sleep(backoff)
                         backoff = min(backoff * 2, 8.0)
                         continue
 
-                resp.raise_for_status()
+                # 4xx falls through to the caller's status check; raising an
+                # HTTPError per bad response just to catch-and-log it again
+                # allocates a traceback on what is a normal path here.
+                if resp.status_code < 400:
+                    if self.limiter:
+                        self.limiter.on_success()
+                    if self._permits is not None:
+                        self._permits.on_success()
                 return resp
 
             except requests.RequestException as e:
@@ -162,83 +678,61 @@ class ToroScraperPlaywright:
                 log.error(f"Failed after {max_attempts} attempts: {url} - {e}")
                 raise
 
-    def process_one_product_sync(self, product_number, index, total):
-        log = logging.getLogger(__name__)
+    def resolve_product_id_sync(self, product_number):
+        """Phase-1 worker: resolve a product's productId.
+
+        load_input_csv guarantees the submitted product list is unique and
+        excludes anything already in the partial/output files, so no
+        per-product dedupe bookkeeping is needed here.
+
+        Returns (product_id, product_number) or None when the product is
+        restricted or not found.
+        """
         global stop_requested
 
         if stop_requested:
             log.info(f"Skipping product {product_number} due to interrupt request")
             return None
 
-        with self.lock:
-            key = str(product_number).strip()
-            if key in self.scraped_product_numbers:
-                log.info(f"Skipping already-scraped product {product_number}")
-                return None
-            self.scraped_product_numbers.add(key)
+        product_id = self.get_product_id_from_catalog(product_number)
+        if not product_id:
+            return None
+        return product_id, product_number
 
-        try:
-            log.info(f"Processing product {index}/{total}: {product_number}")
+    def finish_product_sync(self, product_id, product_number, pricing_result, index, total):
+        """Phase-3 worker: fetch details, merge with pricing, record the row."""
+        global stop_requested
 
-            product_id = self.get_product_id_from_catalog(product_number)
-            if not product_id:
-                return None
+        if stop_requested:
+            log.info(f"Skipping product {product_number} due to interrupt request")
+            return None
 
-            time.sleep(random.uniform(0.10, 0.40))  # jitter between calls
-            result = self.get_product_pricing(product_id, product_number)
-            if not result:
-                return None
+        try:
+            log.info(f"Processing product {index}/{total}: {product_number}")
 
-            time.sleep(random.uniform(0.10, 0.40))
-            product_details = self.get_product_details(product_id)
-
-            result.update({
-                "short_description": product_details.get("shortDescription", ""),
-                "erp_number": product_details.get("erpNumber", ""),
-                "erp_description": product_details.get("erpDescription", ""),
-                "large_image_url": product_details.get("largeImagePath", ""),
-                "shipping_length": product_details.get("shippingLength", ""),
-                "shipping_width": product_details.get("shippingWidth", ""),
-                "shipping_height": product_details.get("shippingHeight", ""),
-                "shipping_weight": product_details.get("shippingWeight", ""),
-                "unit_of_measure": product_details.get("unitOfMeasure", ""),
-                "unit_of_measure_description": product_details.get("unitOfMeasureDescription", ""),
-                "availability_message": product_details.get("availability", {}).get("message", ""),
-                "is_active": product_details.get("isActive", ""),
-                "is_discontinued": product_details.get("isDiscontinued", ""),
-                "can_back_order": product_details.get("canBackOrder", ""),
-                "track_inventory": product_details.get("trackInventory", ""),
-                "minimum_order_qty": product_details.get("minimumOrderQty", ""),
-                "multiple_sale_qty": product_details.get("multipleSaleQty", ""),
-                "sku": product_details.get("sku", ""),
-                "upc_code": product_details.get("upcCode", ""),
-                "model_number": product_details.get("modelNumber", ""),
-                "brand": product_details.get("brand", ""),
-                "product_line": product_details.get("productLine", ""),
-                "tax_code1": product_details.get("taxCode1", ""),
-                "tax_code2": product_details.get("taxCode2", ""),
-                "tax_category": product_details.get("taxCategory", ""),
-                "product_detail_url": product_details.get("productDetailUrl", ""),
-                "is_special_order": product_details.get("isSpecialOrder", ""),
-                "is_gift_card": product_details.get("isGiftCard", ""),
-                "is_subscription": product_details.get("isSubscription", ""),
-                "can_add_to_cart": product_details.get("canAddToCart", ""),
-                "can_add_to_wishlist": product_details.get("canAddToWishlist", ""),
-                "can_show_price": product_details.get("canShowPrice", ""),
-                "can_show_unit_of_measure": product_details.get("canShowUnitOfMeasure", ""),
-                "can_enter_quantity": product_details.get("canEnterQuantity", ""),
-                "requires_real_time_inventory": product_details.get("requiresRealTimeInventory", ""),
-                "availability_message_type": product_details.get("availability", {}).get("messageType", ""),
-                "meta_description": product_details.get("metaDescription", ""),
-                "meta_keywords": product_details.get("metaKeywords", ""),
-                "page_title": product_details.get("pageTitle", ""),
-            })
+            # Cached pricing entries may be shared between runs; never mutate
+            # the object the cache handed back.
+            result = dict(pricing_result)
 
+            if self._inactive_statuses and str(result.get("item_status", "")).strip().lower() in self._inactive_statuses:
+                log.info(f"Skipping details fetch for inactive product {product_number}")
+                product_details = {}
+            else:
+                product_details = self.get_product_details(product_id)
+
+            update = _build_detail_row(product_details)
+            availability = product_details.get("availability") or {}
+            update["availability_message"] = availability.get("message", "")
+            update["availability_message_type"] = availability.get("messageType", "")
+            result.update(update)
+
+            # dict item assignment is atomic in CPython; persistence is handed
+            # to the background writer so workers never block on disk IO.
+            self.results[str(product_number).strip()] = result
+            if self._write_q is not None:
+                self._write_q.put(result)
             with self.lock:
-                self.results.append(result)
                 self.processed_count += 1
-                if self.save_interval > 0 and self.processed_count % self.save_interval == 0:
-                    self.save_partial_results()
 
             return result
 
@@ -246,124 +740,250 @@ class ToroScraperPlaywright:
             log.error(f"Error processing product {product_number}: {e}")
             return None
 
+    @staticmethod
+    def _write_rows_csv(path, rows):
+        """Write result rows to a CSV with the canonical FIELDS schema."""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS, restval="", extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def _ensure_partial_writer(self):
+        if self._partial_writer is None:
+            resuming = self._partial_flushed > 0 and os.path.exists(self.partial_file)
+            self._partial_fh = open(
+                self.partial_file, "a" if resuming else "w", newline="", encoding="utf-8"
+            )
+            self._partial_writer = csv.DictWriter(
+                self._partial_fh, fieldnames=FIELDS, restval="", extrasaction="ignore"
+            )
+            if not resuming:
+                self._partial_writer.writeheader()
+        return self._partial_writer
+
+    def _close_partial_writer(self):
+        if self._partial_fh is not None:
+            try:
+                self._partial_fh.close()
+            except Exception:
+                pass
+            self._partial_fh = None
+            self._partial_writer = None
+
+    def _writer_loop(self):
+        """Drain result rows onto the partial CSV off the worker threads."""
+        pending = 0
+        while True:
+            item = self._write_q.get()
+            try:
+                if item is None:
+                    if pending and self._partial_fh is not None:
+                        self._partial_fh.flush()
+                    return
+                writer = self._ensure_partial_writer()
+                writer.writerow(item)
+                self._partial_flushed += 1
+                pending += 1
+                if pending >= self.save_interval:
+                    self._partial_fh.flush()
+                    log.info(f"Partial results appended to {self.partial_file} ({self._partial_flushed} records)")
+                    pending = 0
+            except Exception as e:
+                log.error(f"Partial writer failed: {e}")
+            finally:
+                self._write_q.task_done()
+
+    def _start_writer(self):
+        if self.save_interval > 0 and self._write_q is None:
+            self._write_q = queue.Queue()
+            self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self._writer_thread.start()
+
+    def _stop_writer(self):
+        if self._write_q is not None:
+            self._write_q.put(None)
+            self._writer_thread.join(timeout=30)
+            self._write_q = None
+            self._writer_thread = None
+
     def save_partial_results(self):
+        """Append results not yet on disk to the partial CSV.
+
+        While the background writer is running it persists rows as they
+        complete, so this only does work as a safety net after the writer
+        has stopped (or when it never started). Appending only the delta
+        keeps each save O(batch); upstream dedupe guarantees unique rows.
+        """
+        if self._write_q is not None:
+            return
         try:
-            if self.results:
-                seen = set()
-                deduped = []
-                for r in self.results:
-                    k = str(r.get("product_number", "")).strip()
-                    if not k or k in seen:
-                        continue
-                    seen.add(k)
-                    deduped.append(r)
-                self.results = deduped
-
-            df = pd.DataFrame(self.results)
-            df.to_csv(self.partial_file, index=False)
-            logging.getLogger(__name__).info(f"Partial results saved to {self.partial_file} ({len(self.results)} records)")
+            new_rows = list(self.results.values())[self._partial_flushed:]
+            if not new_rows:
+                return
+            writer = self._ensure_partial_writer()
+            writer.writerows(new_rows)
+            self._partial_fh.flush()
+            self._partial_flushed = len(self.results)
+            log.info(
+                f"Partial results appended to {self.partial_file} ({self._partial_flushed} records)"
+            )
         except Exception as e:
-            logging.getLogger(__name__).error(f"Failed to save partial results: {e}")
+            log.error(f"Failed to save partial results: {e}")
 
     def load_config(self, config_file):
         try:
             with open(config_file, 'r') as f:
                 config = json.load(f)
-            logging.getLogger(__name__).info(f"Configuration loaded from {config_file}")
+            log.info(f"Configuration loaded from {config_file}")
             return config
         except Exception as e:
-            logging.getLogger(__name__).error(f"Error loading config: {e}")
+            log.error(f"Error loading config: {e}")
             raise
 
     async def authenticate_with_playwright(self):
-        log = logging.getLogger(__name__)
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=self.config.get("headless_mode", True))
-            context = await browser.new_context()
-            page = await context.new_page()
+        state_path = os.path.join(BASE_DIR, ".auth_state.json")
+        browser = await self._ensure_browser()
 
+        context = None
+        saved_session = False
+        if os.path.exists(state_path):
             try:
-                log.info("Starting authentication process...")
+                context = await browser.new_context(storage_state=state_path)
+                saved_session = True
+                log.info("Reusing saved browser session state")
+            except Exception as e:
+                log.warning(f"Failed to load saved session state: {e}")
+                context = None
+        if context is None:
+            context = await browser.new_context()
+        page = await context.new_page()
 
-                await page.goto(self.config["login_url"])
-                await page.wait_for_load_state('networkidle')
+        try:
+            log.info("Starting authentication process...")
 
-                await page.fill('#username', self.config["username"])
-                await page.fill('#password', self.config["password"])
-                await page.click('#signOnButton')
-                await page.wait_for_load_state('networkidle')
-
-                await page.wait_for_url("**/shop.thetorocompany.com/**", timeout=30000)
-
-                bearer_token = await page.evaluate("""
-                    () => {
-                        const accessToken = localStorage.getItem('AccessToken');
-                        if (accessToken) return accessToken;
-                        const cookies = document.cookie.split(';');
-                        for (let cookie of cookies) {
-                            const [name, value] = cookie.trim().split('=');
-                            if (name === 'AccessToken') return value;
-                        }
-                        return null;
-                    }
-                """)
+            # Capture the first Authorization header the app sends; hooked
+            # before any navigation so a token used during the login flow
+            # itself is caught without a second page load.
+            token_future = asyncio.get_running_loop().create_future()
 
-                if not bearer_token:
-                    log.info("Token not found in storage, intercepting network requests...")
-                    tokens = []
+            def handle_request(request):
+                auth_header = request.headers.get('authorization', '')
+                if auth_header.startswith('Bearer ') and not token_future.done():
+                    token_future.set_result(auth_header[7:])
 
-                    def handle_request(request):
-                        auth_header = request.headers.get('authorization', '')
-                        if auth_header and auth_header.startswith('Bearer '):
-                            tokens.append(auth_header.replace('Bearer ', ''))
+            page.on('request', handle_request)
 
-                    page.on('request', handle_request)
+            # networkidle needs a 500ms quiet period and may never fire on
+            # chatty pages; wait on concrete preconditions instead. fill()
+            # auto-waits for its selector and wait_for_url is the single
+            # post-login synchronization point.
+            await page.goto(self.config["login_url"], wait_until="domcontentloaded")
 
-                    await page.goto("https://shop.thetorocompany.com/Product_UrlRoot/41-6820")
-                    await page.wait_for_timeout(7000)
+            if saved_session:
+                # Give a still-valid session a chance to redirect to the
+                # shop before deciding the login form is needed.
+                try:
+                    await page.wait_for_url("**/shop.thetorocompany.com/**", timeout=10000)
+                except Exception:
+                    pass
 
-                    if tokens:
-                        bearer_token = tokens[0]
+            if "shop.thetorocompany.com" not in page.url:
+                await page.fill('#username', self.config["username"])
+                await page.fill('#password', self.config["password"])
+                await page.click('#signOnButton')
 
-                if bearer_token:
-                    self.bearer_token = bearer_token
-                    log.info("Bearer token extracted successfully")
-                    self.session.headers.update({
-                        'Authorization': f'Bearer {bearer_token}',
-                        'Content-Type': 'application/json',
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                    })
-                    return True
-                else:
-                    log.error("Failed to extract bearer token")
-                    return False
+            await page.wait_for_url("**/shop.thetorocompany.com/**", timeout=30000)
 
+            try:
+                await context.storage_state(path=state_path)
             except Exception as e:
-                log.error(f"Authentication error: {e}")
+                log.warning(f"Failed to save browser session state: {e}")
+
+            bearer_token = await page.evaluate("""
+                () => {
+                    const accessToken = localStorage.getItem('AccessToken');
+                    if (accessToken) return accessToken;
+                    const cookies = document.cookie.split(';');
+                    for (let cookie of cookies) {
+                        const [name, value] = cookie.trim().split('=');
+                        if (name === 'AccessToken') return value;
+                    }
+                    return null;
+                }
+            """)
+
+            if not bearer_token:
+                log.info("Token not found in storage, waiting for an authorized API request...")
+                try:
+                    if not token_future.done():
+                        # Nudge the app into issuing an API call in case
+                        # none happened during the login flow.
+                        await page.goto(
+                            "https://shop.thetorocompany.com/Product_UrlRoot/41-6820",
+                            wait_until="domcontentloaded",
+                        )
+                    bearer_token = await asyncio.wait_for(token_future, timeout=30)
+                except asyncio.TimeoutError:
+                    log.error("Timed out waiting for a Bearer token in network traffic")
+
+            if bearer_token:
+                log.info("Bearer token extracted successfully")
+                self._set_session_token(bearer_token)
+                self._store_cached_token(bearer_token)
+                return True
+            else:
+                log.error("Failed to extract bearer token")
                 return False
-            finally:
-                await browser.close()
+
+        except Exception as e:
+            log.error(f"Authentication error: {e}")
+            return False
+        finally:
+            await context.close()
 
     def get_product_id_from_catalog(self, product_number):
-        log = logging.getLogger(__name__)
+        key = str(product_number).strip()
+        with self._pid_cache_lock:
+            cached = self._pid_cache.get(key)
+        if cached:
+            return cached
         try:
             catalog_url = f"https://shop.thetorocompany.com/api/v1/catalogpages?path=%2FProduct_UrlRoot%2F{product_number}"
-            resp = self._request_with_backoff("GET", catalog_url)
+            # Only productId is needed from a payload that also carries
+            # category/SEO blobs; with ijson installed, stream the body and
+            # stop reading as soon as the key appears.
+            resp = self._request_with_backoff("GET", catalog_url, stream=ijson is not None)
 
-            ctype = (resp.headers.get("Content-Type") or "").lower()
-            text = resp.text or ""
-            if "customer product restriction" in text.lower():
-                log.info(f"Restricted product (no access): {product_number}")
-                return None
+            try:
+                if resp.status_code >= 400:
+                    if b"customer product restriction" in (resp.content or b"").lower():
+                        log.info(f"Restricted product (no access): {product_number}")
+                        return None
+                    log.warning(f"Catalog lookup failed for {product_number} (status {resp.status_code})")
+                    return None
 
-            if "application/json" not in ctype:
-                log.warning(f"Non-JSON catalog response for {product_number} (status {resp.status_code}); skipping.")
-                return None
+                ctype = (resp.headers.get("Content-Type") or "").lower()
+                if "application/json" not in ctype:
+                    log.warning(f"Non-JSON catalog response for {product_number} (status {resp.status_code}); skipping.")
+                    return None
+
+                if ijson is not None:
+                    resp.raw.decode_content = True  # gunzip transparently
+                    product_id = None
+                    for prefix, _event, value in ijson.parse(resp.raw):
+                        if prefix == "productId":
+                            product_id = value
+                            break
+                else:
+                    product_id = _json_loads(resp.content).get("productId")
+            finally:
+                resp.close()
 
-            data = resp.json()
-            product_id = data.get("productId")
             if product_id:
                 log.info(f"Found productId {product_id} for product {product_number}")
+                with self._pid_cache_lock:
+                    self._pid_cache[key] = product_id
+                    self._pid_cache_dirty = True
                 return product_id
             log.warning(f"No productId found for product {product_number}")
             return None
@@ -373,27 +993,59 @@ class ToroScraperPlaywright:
             return None
 
     def get_product_details(self, product_id):
-        log = logging.getLogger(__name__)
+        cache_key = f"details:{product_id}"
+        if self.response_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         try:
+            # No expand= at all: every field read downstream is a scalar on
+            # the product object (plus availability), so the expanded
+            # collections only inflate the payload. addToRecentlyViewed=false
+            # keeps the scraper out of the account's browsing history.
             url = (
                 f"https://shop.thetorocompany.com/api/v1/products/{product_id}"
-                "?addToRecentlyViewed=true"
-                "&expand=documents,specifications,styledproducts,htmlcontent,attributes,crosssells,pricing,relatedproducts"
+                "?addToRecentlyViewed=false"
                 "&includeAlternateInventory=false"
                 "&includeAttributes=IncludeOnProduct"
                 "&replaceProducts=false"
             )
             response = self._request_with_backoff("GET", url)
-            data = response.json()
+            if response.status_code >= 400:
+                log.warning(f"Details request failed for {product_id} (status {response.status_code})")
+                return {}
+            data = _json_loads(response.content)
             product = data.get("product", {})
+            if self.response_cache and product:
+                self.response_cache.set(cache_key, product)
             return product
         except Exception as e:
             log.error(f"Error getting product details for {product_id}: {e}")
             return {}
 
-    def get_product_pricing(self, product_id, product_number):
-        """Get product pricing from realtime pricing API"""
-        log = logging.getLogger(__name__)
+    def get_product_pricing_batch(self, batch):
+        """Get pricing for a chunk of products with one realtimepricing POST.
+
+        `batch` is a list of (product_id, product_number) pairs; the payload
+        schema is already an array, so the API prices N products per call.
+        Returns {product_id: combined_result}; products the API returned no
+        pricing for are simply absent.
+        """
+        qty = self.config["rsv_qty"]
+        results = {}
+        to_fetch = []
+        for product_id, product_number in batch:
+            if self.response_cache:
+                cached = self.response_cache.get(f"pricing:{product_id}:{qty}")
+                if cached is not None:
+                    results[product_id] = cached
+                    continue
+            to_fetch.append((product_id, product_number))
+
+        if not to_fetch:
+            return results
+
+        numbers = {pid: pn for pid, pn in to_fetch}
         try:
             pricing_url = "https://shop.thetorocompany.com/api/v1/realtimepricing"
             payload = {
@@ -401,31 +1053,45 @@ class ToroScraperPlaywright:
                     {
                         "productId": product_id,
                         "unitOfMeasure": "EA",
-                        "qtyOrdered": self.config["rsv_qty"]
+                        "qtyOrdered": qty
                     }
+                    for product_id, _ in to_fetch
                 ]
             }
 
-            response = self._request_with_backoff("POST", pricing_url, json=payload)
-            data = response.json()
-            pricing_results = data.get('realTimePricingResults', [])
+            # data= with a pre-encoded body; the session already carries
+            # Content-Type: application/json, and this skips requests'
+            # stdlib json.dumps path.
+            response = self._request_with_backoff("POST", pricing_url, data=_json_dumps(payload))
+            if response.status_code >= 400:
+                log.warning(f"Pricing request failed for batch of {len(to_fetch)} products (status {response.status_code})")
+                return results
+            data = _json_loads(response.content)
+
+            inventory_json = {}
+            properties = data.get('properties', {})
+            if 'realTimeInventoryResults' in properties:
+                try:
+                    inventory_json = _json_loads(properties['realTimeInventoryResults'])
+                except Exception:
+                    inventory_json = {}
 
-            if pricing_results:
-                result = pricing_results[0]
+            for result in data.get('realTimePricingResults', []):
+                product_id = result.get('productId')
+                product_number = numbers.get(product_id)
+                if not product_number:
+                    continue
 
                 inventory_data = {}
-                properties = data.get('properties', {})
-                if 'realTimeInventoryResults' in properties:
+                inventory_info = inventory_json.get(product_id)
+                if inventory_info:
                     try:
-                        inventory_json = json.loads(properties['realTimeInventoryResults'])
-                        if product_id in inventory_json:
-                            inventory_info = inventory_json[product_id]
-                            inventory_data = {
-                                'qty_on_hand': inventory_info.get('QtyOnHand', 0),
-                                'availability_message': inventory_info.get('InventoryAvailabilityDtos', [{}])[0].get('Availability', {}).get('Message', ''),
-                                'item_status': inventory_info.get('AdditionalResults', {}).get('ItemStatus', ''),
-                                'available_date': inventory_info.get('AdditionalResults', {}).get('AvailableDate', '')
-                            }
+                        inventory_data = {
+                            'qty_on_hand': inventory_info.get('QtyOnHand', 0),
+                            'availability_message': inventory_info.get('InventoryAvailabilityDtos', [{}])[0].get('Availability', {}).get('Message', ''),
+                            'item_status': inventory_info.get('AdditionalResults', {}).get('ItemStatus', ''),
+                            'available_date': inventory_info.get('AdditionalResults', {}).get('AvailableDate', '')
+                        }
                     except Exception:
                         pass
 
@@ -447,46 +1113,43 @@ class ToroScraperPlaywright:
                     **inventory_data
                 }
 
-                log.info(f"Successfully scraped data for {product_number}")
-                return combined_result
-            else:
-                log.warning(f"No pricing results for {product_number}")
-                return None
+                log.info(f"Successfully scraped pricing for {product_number}")
+                if self.response_cache:
+                    self.response_cache.set(f"pricing:{product_id}:{qty}", combined_result)
+                results[product_id] = combined_result
+
+            missing = [pn for pid, pn in to_fetch if pid not in results]
+            if missing:
+                log.warning(f"No pricing results for {', '.join(missing)}")
 
         except Exception as e:
-            log.error(f"Error getting pricing for {product_number}: {e}")
-            return None
+            log.error(f"Error getting pricing for batch of {len(to_fetch)} products: {e}")
+        return results
 
     def load_input_csv(self):
-        log = logging.getLogger(__name__)
         try:
-            df = pd.read_csv(self.config["input_file"])
-
-            def extract_product_number(sku):
-                if pd.isna(sku) or not isinstance(sku, str):
-                    return None
-                if sku.startswith('TOR~'):
-                    after_tor = sku[4:]
-                    if '~' in after_tor:
-                        product_number = after_tor.split('~')[0]
-                    else:
-                        product_number = after_tor
-                    return str(product_number).strip()
-                return None
-
-            df['Product Number'] = df['SKU'].apply(extract_product_number)
-            df_filtered = df[df['Product Number'].notna()]
-            products = df_filtered['Product Number'].tolist()
+            products = []
+            total_rows = 0
+            with open(self.config["input_file"], "r", newline="", encoding="utf-8-sig") as f:
+                for row in csv.DictReader(f):
+                    total_rows += 1
+                    product_number = extract_product_number(row.get("SKU"))
+                    if product_number:
+                        products.append(product_number)
 
             if self.save_interval > 0 and os.path.exists(self.partial_file):
                 try:
-                    df_partial = pd.read_csv(self.partial_file)
-                    processed_products = {str(x).strip() for x in df_partial.get('product_number', []).tolist()}
-                    products = [str(p).strip() for p in products]
-                    products = [p for p in products if p and p not in processed_products]
-                    self.results = df_partial.to_dict(orient='records')
+                    with open(self.partial_file, "r", newline="", encoding="utf-8") as f:
+                        partial_rows = list(csv.DictReader(f))
+                    self.results = {
+                        str(r.get("product_number", "")).strip(): r
+                        for r in partial_rows
+                        if str(r.get("product_number", "")).strip()
+                    }
+                    processed_products = set(self.results)
+                    products = [p for p in products if p not in processed_products]
                     self.processed_count = len(self.results)
-                    self.scraped_product_numbers = set(processed_products)
+                    self._partial_flushed = len(self.results)
                     log.info(f"Resuming from partial file with {self.processed_count} records")
                 except Exception as e:
                     log.warning(f"Failed to load partial file: {e}")
@@ -494,15 +1157,16 @@ class ToroScraperPlaywright:
             output_file = self.config.get("output_file")
             if output_file and os.path.exists(output_file):
                 try:
-                    df_output = pd.read_csv(output_file)
-                    scraped_products = {str(x).strip() for x in df_output.get('product_number', []).tolist()}
+                    with open(output_file, "r", newline="", encoding="utf-8") as f:
+                        scraped_products = {str(r.get("product_number", "")).strip() for r in csv.DictReader(f)}
+                    scraped_products.discard("")
                     products = [p for p in products if p not in scraped_products]
                     log.info(f"Excluded {len(scraped_products)} products already in output file")
                 except Exception as e:
                     log.warning(f"Failed to load output file for duplicate check: {e}")
 
             log.info(f"Loaded {len(products)} products from {self.config['input_file']}")
-            log.info(f"Filtered from {len(df)} total rows to {len(products)} valid Toro SKUs")
+            log.info(f"Filtered from {total_rows} total rows to {len(products)} valid Toro SKUs")
 
             max_rows = self.config.get("max_rows", "all")
             if isinstance(max_rows, str) and max_rows.lower() == "all":
@@ -517,6 +1181,10 @@ class ToroScraperPlaywright:
 
             products = [str(p).strip() for p in products if isinstance(p, str) and p.strip()]
             products = list(dict.fromkeys(products))
+            # Lexicographic order groups similar product numbers together,
+            # which tends to help server-side cache locality; output rows are
+            # keyed by product_number so ordering is free to change.
+            products.sort()
             return products
 
         except Exception as e:
@@ -524,37 +1192,25 @@ class ToroScraperPlaywright:
             raise
 
     def save_results_to_csv(self):
-        log = logging.getLogger(__name__)
         try:
             if not self.results:
                 log.warning("No results to save")
                 return None
 
-            seen = set()
-            deduped = []
-            for r in self.results:
-                k = str(r.get("product_number", "")).strip()
-                if not k or k in seen:
-                    continue
-                seen.add(k)
-                deduped.append(r)
-            self.results = deduped
-
-            df = pd.DataFrame(self.results)
-
             output_file = self.config["output_file"]
             if os.path.exists(output_file) and not self.config.get("overwrite_existing", True):
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 name, ext = os.path.splitext(output_file)
                 output_file = f"{name}_{timestamp}{ext}"
 
-            df.to_csv(output_file, index=False)
+            self._write_rows_csv(output_file, self.results.values())
             log.info(f"Results saved to {output_file}")
             log.info(f"Total products scraped: {len(self.results)}")
 
             if self.save_interval > 0 and os.path.exists(self.partial_file):
+                self._close_partial_writer()
                 os.remove(self.partial_file)
-                logging.getLogger(__name__).info(f"Deleted partial file {self.partial_file}")
+                log.info(f"Deleted partial file {self.partial_file}")
 
             return output_file
 
@@ -568,7 +1224,6 @@ class ToroScraperPlaywright:
         pwd = (self.config.get("ftp_password") or "").strip()
         port = (self.config.get("ftp_port", 21))
         remote_dir = (self.config.get("ftp_directory") or "").strip()
-        log = logging.getLogger(__name__)
 
         if not host or not user or not pwd:
             log.info("FTP settings not provided; skipping FTP upload.")
@@ -583,6 +1238,7 @@ class ToroScraperPlaywright:
             with FTP() as ftp:
                 ftp.connect(host, port, timeout=30)
                 ftp.login(user, pwd)
+                ftp.set_pasv(True)
                 log.info("FTP login successful.")
 
                 if remote_dir:
@@ -600,9 +1256,28 @@ class ToroScraperPlaywright:
                             ftp.cwd(part)
 
                 filename = os.path.basename(local_path)
+
+                # Daily runs often produce identical output; compare against a
+                # remote .md5 sidecar and skip the transfer when unchanged.
                 with open(local_path, "rb") as f:
+                    local_md5 = hashlib.md5(f.read()).hexdigest()
+                md5_name = f"{filename}.md5"
+                remote_md5 = bytearray()
+                try:
+                    ftp.retrbinary(f"RETR {md5_name}", remote_md5.extend)
+                except error_perm:
+                    pass
+                if remote_md5.decode("ascii", "ignore").strip() == local_md5:
+                    log.info(f"Remote {filename} already matches local file (md5); skipping upload.")
+                    return True
+
+                with open(local_path, "rb", buffering=1024 * 1024) as f:
                     log.info(f"Uploading {filename} ...")
-                    ftp.storbinary(f"STOR {filename}", f)
+                    # 1MB blocks instead of the 8KB default: far fewer
+                    # syscalls per MB on large outputs.
+                    ftp.storbinary(f"STOR {filename}", f, blocksize=1024 * 1024)
+
+                ftp.storbinary(f"STOR {md5_name}", io.BytesIO(local_md5.encode("ascii")))
 
                 log.info("FTP upload completed successfully.")
                 return True
@@ -612,40 +1287,84 @@ class ToroScraperPlaywright:
             return False
 
     async def scrape_all_products(self):
-        log = logging.getLogger(__name__)
         global stop_requested
         try:
-            if not await self.authenticate_with_playwright():
-                log.error("Authentication failed")
-                return False
+            cached_token = self._load_cached_token()
+            if cached_token:
+                log.info("Using cached bearer token; skipping browser login")
+                self._set_session_token(cached_token)
+            else:
+                # Run the login on the auth loop so the browser lives where
+                # worker-thread re-auth can reach it.
+                authenticated = await asyncio.get_running_loop().run_in_executor(None, self._authenticate)
+                if not authenticated:
+                    log.error("Authentication failed")
+                    return False
 
             products = self.load_input_csv()
-            total = len(products)
 
-            concurrency = int(self.config.get("concurrency", 6))
+            concurrency = self.concurrency
             log.info(f"Starting threaded scrape with concurrency={concurrency}")
 
-            from concurrent.futures import ThreadPoolExecutor, as_completed
+            pricing_batch = max(1, int(self.config.get("pricing_batch", 25) or 1))
+            self._permits = AdaptiveLimiter(concurrency)
 
-            results_local = []
+            self._start_writer()
             with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                # Phase 1: claim each product and resolve its productId.
+                resolved = []
                 futures = {}
-                for i, pn in enumerate(products):
+                for pn in products:
                     if stop_requested:
                         log.info("Interrupt detected, stopping submission of new products")
                         break
-                    futures[executor.submit(self.process_one_product_sync, pn, i + 1, total)] = pn
+                    futures[executor.submit(self.resolve_product_id_sync, pn)] = pn
+                for fut in as_completed(futures):
+                    try:
+                        pair = fut.result()
+                        if pair:
+                            resolved.append(pair)
+                    except Exception as e:
+                        log.error(f"Unhandled exception for product {futures[fut]}: {e}")
 
+                # Phase 2: one realtimepricing POST per chunk of products.
+                priced = []
+                batch_futures = {}
+                for i in range(0, len(resolved), pricing_batch):
+                    if stop_requested:
+                        break
+                    chunk = resolved[i:i + pricing_batch]
+                    batch_futures[executor.submit(self.get_product_pricing_batch, chunk)] = chunk
+                for fut in as_completed(batch_futures):
+                    chunk = batch_futures[fut]
+                    try:
+                        by_id = fut.result()
+                    except Exception as e:
+                        log.error(f"Unhandled exception pricing batch of {len(chunk)}: {e}")
+                        continue
+                    for product_id, product_number in chunk:
+                        pricing = by_id.get(product_id)
+                        if pricing:
+                            priced.append((product_id, product_number, pricing))
+
+                # Phase 3: per-product details fetch and merge; workers append
+                # their own results to self.results, so this loop only
+                # surfaces unhandled exceptions.
+                futures = {}
+                for i, (product_id, product_number, pricing) in enumerate(priced):
+                    if stop_requested:
+                        break
+                    futures[executor.submit(
+                        self.finish_product_sync, product_id, product_number,
+                        pricing, i + 1, len(priced)
+                    )] = product_number
                 for fut in as_completed(futures):
                     try:
-                        res = fut.result()
-                        if res:
-                            results_local.append(res)
+                        fut.result()
                     except Exception as e:
-                        pn = futures[fut]
-                        log.error(f"Unhandled exception for product {pn}: {e}")
+                        log.error(f"Unhandled exception for product {futures[fut]}: {e}")
 
-            self.results.extend(results_local)
+            self._stop_writer()
 
             if stop_requested:
                 self.save_partial_results()
@@ -654,7 +1373,8 @@ class ToroScraperPlaywright:
 
             output_path = self.save_results_to_csv()
             if output_path:
-                self.upload_via_ftp(output_path)
+                # The synchronous FTP upload should not stall the event loop.
+                await asyncio.get_running_loop().run_in_executor(None, self.upload_via_ftp, output_path)
 
             log.info("Scraping completed successfully")
             return True
@@ -662,6 +1382,13 @@ class ToroScraperPlaywright:
         except Exception as e:
             log.error(f"Error in scraping workflow: {e}")
             return False
+        finally:
+            self._stop_writer()
+            self._close_partial_writer()
+            self._save_pid_cache()
+            if self.response_cache:
+                self.response_cache.close()
+            await asyncio.get_running_loop().run_in_executor(None, self.close)
 
 async def main():
     parser = argparse.ArgumentParser()
@@ -671,11 +1398,11 @@ async def main():
 
     cfg_path = args.config if os.path.isabs(args.config) else os.path.join(BASE_DIR, args.config)
     setup_logging_from_config(cfg_path)
-    logger = logging.getLogger(__name__)
 
     scraper = ToroScraperPlaywright(cfg_path)
     if args.concurrency is not None:
         scraper.config["concurrency"] = args.concurrency
+        scraper.concurrency = args.concurrency
     success = await scraper.scrape_all_products()
 
     if success: